@@ -0,0 +1,186 @@
+import argparse
+import glob
+import os
+import re
+import sys
+from multiprocessing import Pool
+
+import joblib
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Set the environment variable
+os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(MODEL_DIR, '..', 'data')
+
+MODEL_PATH = os.path.join(MODEL_DIR, 'my_model.h5')
+SCALER_PATH = os.path.join(MODEL_DIR, 'scaler.pkl')
+
+# Same column order the scaler and the LSTM were trained on
+FEATURES = [
+    'temperature',
+    'heart_rate',
+    'oxygen_saturation',
+    'blood_pressure_systolic',
+    'blood_pressure_diastolic',
+    'blood_sugar',
+    'respiratory_rate'
+]
+
+PATIENT_FILE_PATTERN = re.compile(r'patient_(\d+)_data\.csv$')
+
+# Loaded once per worker process by init_worker
+model = None
+scaler = None
+look_back = None
+
+
+def init_worker():
+    global model, scaler, look_back
+    import tensorflow as tf
+
+    # Every worker gets its own process, so keep TensorFlow on one core per worker
+    # instead of letting each one spawn a thread per core
+    tf.config.threading.set_intra_op_parallelism_threads(1)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    model = tf.keras.models.load_model(MODEL_PATH)
+    scaler = joblib.load(SCALER_PATH)
+    look_back = model.input_shape[1]
+
+
+def find_patient_ids(data_dir):
+    patient_ids = []
+    for filename in glob.glob(os.path.join(data_dir, 'patient_*_data.csv')):
+        match = PATIENT_FILE_PATTERN.search(filename)
+        if match:
+            patient_ids.append(int(match.group(1)))
+    return sorted(patient_ids)
+
+
+def load_patient_vitals(data_dir, patient_id):
+    filename = os.path.join(data_dir, f"patient_{patient_id}_data.csv")
+    patient_df = pd.read_csv(filename, usecols=['minute'] + FEATURES)
+    return patient_df['minute'].values, patient_df[FEATURES].values
+
+
+# Build overlapping windows (one per minute, stride 1) as a view over the scaled vitals,
+# shape [windows, look_back, features], without copying the underlying data
+def sliding_windows(values, window):
+    return sliding_window_view(values, window, axis=0).transpose(0, 2, 1)
+
+
+# The window ending at minute t scores minute t with its last timestep, the first
+# look_back - 1 minutes have no full history and take the first window's outputs.
+# Only one batch of windows is made contiguous at a time, so peak memory stays at
+# one batch instead of every window of the patient
+def score_windows(windows, batch_size):
+    risk = np.empty(look_back - 1 + len(windows), dtype=np.float32)
+    for i in range(0, len(windows), batch_size):
+        batch = np.ascontiguousarray(windows[i:i + batch_size])
+        batch_out = model.predict_on_batch(batch)
+        if i == 0:
+            risk[:look_back - 1] = batch_out[0, :-1, 0]
+        risk[look_back - 1 + i:look_back - 1 + i + len(batch)] = batch_out[:, -1, 0]
+    return risk
+
+
+def score_patients(task):
+    data_dir, patient_ids, batch_size = task
+
+    written = []
+    failed = []
+    for patient_id in patient_ids:
+        # One bad patient file must not abort the backfill of every other patient
+        try:
+            patient_minutes, vitals = load_patient_vitals(data_dir, patient_id)
+            if len(vitals) < look_back:
+                print(f"Skipping patient {patient_id}: {len(vitals)} minutes is shorter than {look_back}")
+                continue
+
+            # Scale every minute once, the windows below all share these rows
+            vitals_scaled = scaler.transform(vitals).astype(np.float32)
+            windows = sliding_windows(vitals_scaled, look_back)
+
+            risk_df = pd.DataFrame({
+                'minute': patient_minutes,
+                'risk': score_windows(windows, batch_size)
+            })
+            written.append(write_patient_risk(data_dir, patient_id, risk_df))
+        except Exception as e:
+            print(f"Skipping patient {patient_id}: {e}")
+            failed.append(patient_id)
+
+    return written, failed
+
+
+# Write through a temporary file so the server never reads a half-written report
+def write_patient_risk(data_dir, patient_id, risk_df):
+    filename = os.path.join(data_dir, f"patient_{patient_id}_risk.csv")
+    temp_filename = filename + '.tmp'
+    try:
+        risk_df.to_csv(temp_filename, index=False)
+        os.replace(temp_filename, filename)
+    except BaseException:
+        if os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        raise
+    return filename
+
+
+# A killed run can still leave temporary reports behind, drop them before starting
+def remove_stale_temp_files(data_dir):
+    for temp_filename in glob.glob(os.path.join(data_dir, 'patient_*_risk.csv.tmp')):
+        os.remove(temp_filename)
+
+
+def chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive integer")
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score the historical vitals of every patient with the monitoring LSTM')
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--workers', type=positive_int, default=os.cpu_count() or 1)
+    parser.add_argument('--patients-per-task', type=positive_int, default=16)
+    parser.add_argument('--batch-size', type=positive_int, default=1024)
+    args = parser.parse_args()
+
+    remove_stale_temp_files(args.data_dir)
+
+    patient_ids = find_patient_ids(args.data_dir)
+    tasks = [(args.data_dir, patient_chunk, args.batch_size)
+             for patient_chunk in chunks(patient_ids, args.patients_per_task)]
+    if not tasks:
+        print(f"No patient data found in {args.data_dir}")
+        return
+
+    # Every worker imports TensorFlow and loads the model, so don't start more than there are tasks
+    workers = min(args.workers, len(tasks))
+    print(f"Backfilling risk scores for {len(patient_ids)} patients with {workers} workers...")
+
+    failed = []
+    with Pool(workers, initializer=init_worker) as pool:
+        for task_written, task_failed in pool.imap_unordered(score_patients, tasks):
+            for filename in task_written:
+                print(f"Wrote {filename}")
+            failed.extend(task_failed)
+
+    if failed:
+        print(f"Failed to score {len(failed)} of {len(patient_ids)} patients: {sorted(failed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()